@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Approximate answers for interactive exploration of large sales data.
+#
+# A reservoir sample of fixed size is kept for every Product (the stratum),
+# together with the number of rows seen per Product. Crosstab probabilities,
+# means and quantiles are then estimated from the sample with stratified
+# weights, and every estimate comes with a confidence half-width:
+#
+#   sample = StratifiedSample(size=2000)
+#   for chunk in pd.read_csv('sales.csv', chunksize=1_000_000):
+#       sample.update(aerofit_data.prepare_data(chunk))
+#
+#   sample.crosstab('Product', 'Gender', normalize='columns', budget=0.05)
+#   sample.quantile('Miles', [0.25, 0.75])
+#   sample.mean('Income')
+#
+# For pre-aggregated data pass the name of the count column as `weight`: rows
+# are still sampled uniformly, but every sampled row counts for `weight`
+# customers, so the estimates are stratified totals of weight * value and
+# refer to customers rather than rows, as on the expanded data.
+#
+# Query time grows with the sample size only; the reservoirs are combined once
+# per `update`, not per query. A latency budget (seconds) is best effort: the
+# query uses a smaller random part of each reservoir (at least two rows per
+# Product), sized from the rows per second measured on earlier queries, and
+# the error bounds widen accordingly. Every Estimate reports its elapsed time
+# and `within_budget`, so a caller can see when the budget was missed.
+
+import time
+from collections import namedtuple
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+
+Estimate = namedtuple('Estimate', ['value', 'error', 'rows', 'elapsed', 'within_budget'])
+
+
+class StratifiedSample:
+
+    def __init__(self, size=2000, stratum='Product', confidence=0.95, seed=None, weight=None):
+        self.size = size
+        self.stratum = stratum
+        self.weight = weight
+        self.z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        self.population = {}
+        self.reservoirs = {}
+        self._rng = np.random.default_rng(seed)
+        self._rows_per_second = 1e6
+        self._combined = None
+
+    def update(self, df):
+        for key, group in df.groupby(self.stratum, sort=False):
+            self._update(key, group.reset_index(drop=True))
+        self._combine()
+        return self
+
+    def _combine(self):
+        # all reservoirs in one frame, one block of rows per stratum
+        self._sizes = np.array([len(r) for r in self.reservoirs.values()])
+        self._starts = np.concatenate([[0], np.cumsum(self._sizes)[:-1]])
+        self._population = np.array([self.population[key] for key in self.reservoirs], dtype=float)
+        self._combined = pd.concat(list(self.reservoirs.values()), ignore_index=True)
+
+    def _update(self, key, group):
+        seen = self.population.get(key, 0)
+        reservoir = self.reservoirs.get(key)
+        filled = 0 if reservoir is None else len(reservoir)
+        take = min(self.size - filled, len(group))
+        if take:
+            head = group.iloc[:take]
+            reservoir = head if reservoir is None else pd.concat([reservoir, head], ignore_index=True)
+            # kept in random order, so any prefix is itself a random sample
+            reservoir = reservoir.iloc[self._rng.permutation(len(reservoir))].reset_index(drop=True)
+        rest = group.iloc[take:]
+        if len(rest):
+            # algorithm R: the t-th row of the stratum replaces a random slot
+            # with probability size / t
+            t = seen + take + np.arange(1, len(rest) + 1)
+            slots = (self._rng.random(len(rest)) * t).astype(np.int64)
+            hit = np.flatnonzero(slots < self.size)
+            # when a slot is hit twice in one chunk the later row wins
+            slots, last = np.unique(slots[hit][::-1], return_index=True)
+            rows = hit[::-1][last]
+            for i, column in enumerate(reservoir.columns):
+                reservoir.iloc[slots, i] = rest[column].to_numpy()[rows]
+        self.reservoirs[key] = reservoir
+        self.population[key] = seen + len(group)
+
+    # ### sample used by a query
+
+    def _sample(self, budget):
+        # the rows used by a query and, per row, the population and sample
+        # size of its stratum and the number of customers it stands for
+        if self._combined is None:
+            raise ValueError("the sample is empty")
+        sizes = self._sizes
+        sample = self._combined
+        if budget is not None and sizes.sum():
+            fraction = min(1.0, budget * self._rows_per_second / sizes.sum())
+            if fraction < 1:
+                sizes = np.minimum(self._sizes, np.maximum(2, np.ceil(fraction * self._sizes))).astype(int)
+                sample = sample.iloc[np.concatenate([start + np.arange(n)
+                                                     for start, n in zip(self._starts, sizes)])]
+        design = {"sizes": sizes,
+                  "N": np.repeat(self._population, sizes),
+                  "n": np.repeat(sizes, sizes).astype(float),
+                  "weight": (np.ones(len(sample)) if self.weight is None
+                             else sample[self.weight].to_numpy(dtype=float))}
+        return sample, design
+
+    def _timed(self, budget, query):
+        start = time.perf_counter()
+        sample, design = self._sample(budget)
+        value, error = query(sample, design)
+        elapsed = time.perf_counter() - start
+        if elapsed > 0:
+            self._rows_per_second = 0.5 * self._rows_per_second + 0.5 * len(sample) / elapsed
+        return Estimate(value, error, len(sample), elapsed, budget is None or elapsed <= budget)
+
+    def _ratio(self, design, y, x):
+        # stratified ratio estimate sum(w*y)/sum(w*x) for every column of y
+        # and x, with its linearised standard error; y and x are per customer
+        y = y * design["weight"][:, None]
+        x = x * design["weight"][:, None]
+        w = (design["N"] / design["n"])[:, None]
+        Y, X = (w * y).sum(axis=0), (w * x).sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ratio = Y / X
+            d = y - ratio * x
+            variance = np.zeros_like(ratio)
+            stop = np.cumsum(design["sizes"])
+            for N, n, end in zip(self._population, design["sizes"], stop):
+                if n > 1:
+                    variance += N ** 2 * (1 - n / N) * d[end - n:end].var(axis=0, ddof=1) / n
+            se = np.sqrt(variance) / X
+        return ratio, se
+
+    # ### queries
+
+    def crosstab(self, rows, cols, normalize='all', budget=None):
+        def query(sample, design):
+            index = pd.Categorical(sample[rows])
+            columns = pd.Categorical(sample[cols])
+            cells = pd.MultiIndex.from_product([index.categories, columns.categories])
+            y = ((index.codes[:, None] == cells.codes[0][None, :]) &
+                 (columns.codes[:, None] == cells.codes[1][None, :])).astype(float)
+            if normalize == 'all':
+                x = np.ones_like(y)
+            elif normalize == 'index':
+                x = (index.codes[:, None] == cells.codes[0][None, :]).astype(float)
+            elif normalize == 'columns':
+                x = (columns.codes[:, None] == cells.codes[1][None, :]).astype(float)
+            else:
+                raise ValueError(f"unknown normalize {normalize!r}")
+            ratio, se = self._ratio(design, y, x)
+            shape = (len(index.categories), len(columns.categories))
+            value = pd.DataFrame(ratio.reshape(shape), index=pd.Index(index.categories, name=rows),
+                                 columns=pd.Index(columns.categories, name=cols))
+            error = pd.DataFrame(self.z * se.reshape(shape), index=value.index, columns=value.columns)
+            return value, error
+        return self._timed(budget, query)
+
+    def mean(self, column, budget=None):
+        def query(sample, design):
+            y = sample[[column]].to_numpy(dtype=float)
+            ratio, se = self._ratio(design, y, np.ones_like(y))
+            return ratio[0], self.z * se[0]
+        return self._timed(budget, query)
+
+    def quantile(self, column, q, budget=None):
+        # weighted sample quantile; the bounds are Woodruff intervals, i.e. the
+        # quantiles at q -/+ the error of the estimated proportion below it
+        def query(sample, design):
+            values = sample[column].to_numpy(dtype=float)
+            order = np.argsort(values, kind='stable')
+            w = (design["N"] / design["n"] * design["weight"])[order]
+            cdf = np.cumsum(w) / w.sum()
+            ordered = values[order]
+
+            def at(p):
+                return ordered[np.minimum(np.searchsorted(cdf, np.clip(p, 0, 1)), len(ordered) - 1)]
+
+            qs = np.atleast_1d(np.asarray(q, dtype=float))
+            estimate = at(qs)
+            below = (values[:, None] <= estimate[None, :]).astype(float)
+            _, se = self._ratio(design, below, np.ones_like(below))
+            low, high = at(qs - self.z * se), at(qs + self.z * se)
+            value = pd.Series(estimate, index=qs, name=column)
+            error = pd.DataFrame({'low': low, 'high': high}, index=qs)
+            return value, error
+        return self._timed(budget, query)
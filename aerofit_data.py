@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Loading, preparing and summarising the AeroFit treadmill data.
+#
+# These are the same steps as in "Aerofit Case study.py" (In[394] to In[479]),
+# written as plain functions so other tools can reuse them without running
+# the whole notebook.
+
+import numpy as np
+import pandas as pd
+
+
+DATA_PATH = 'Aerofit_treadmill.csv'
+
+product_price = pd.DataFrame({
+ "Product":["KP281","KP481","KP781"],
+ "Product_price":[1500,1750,2500]
+ })
+
+fitness_categories = {1:"Poor Shape",
+ 5:"Excellent Shape",
+ 4:"Good Shape",
+ 3:"Average Shape",
+ 2:"Bad Shape"}
+
+
+def load_data(path=DATA_PATH):
+    return pd.read_csv(path)
+
+
+def prepare_data(df, price=product_price):
+    # merging product prices, fitness by category and miles per day of usage
+    df = df.merge(price, on="Product", how="left")
+    df["Fitness_category"] = df['Fitness'].replace(fitness_categories)
+    df['Miles per 1 use'] = df['Miles']/df['Usage']
+    return df
+
+
+# Every summary takes an optional `weight`: the name of a column holding how
+# many customers a row stands for (for pre-aggregated input). Weighted results
+# are the same as the unweighted results on the data with each row repeated
+# `weight` times, and the weight column itself is left out.
+
+def _weights(df, weight):
+    return np.ones(len(df)) if weight is None else df[weight].to_numpy(dtype=float)
+
+
+def _numeric(df, weight):
+    return df.select_dtypes('number').drop(columns=[weight] if weight is not None else [])
+
+
+def _whole(weights):
+    return bool(np.all(np.mod(weights, 1) == 0))
+
+
+def _as_counts(table, weights):
+    # whole-number weights give integer counts, like the unweighted tables
+    return table.astype(np.int64) if _whole(weights) else table
+
+
+def percentile(values, q, weights=None):
+    # np.percentile (linear interpolation) of the values repeated `weights` times
+    values = np.asarray(values, dtype=float)
+    if weights is None:
+        return np.percentile(values, q)
+    order = np.argsort(values, kind='stable')
+    values, cumulative = values[order], np.cumsum(np.asarray(weights, dtype=float)[order])
+    position = (cumulative[-1] - 1) * np.asarray(q, dtype=float) / 100
+    lower = np.floor(position)
+    at_lower = values[np.minimum(np.searchsorted(cumulative, lower, side='right'), len(values) - 1)]
+    at_upper = values[np.minimum(np.searchsorted(cumulative, lower + 1, side='right'), len(values) - 1)]
+    return at_lower + (at_upper - at_lower) * (position - lower)
+
+
+def describe(df, weight=None):
+    if weight is None:
+        return df.describe()
+    w = _weights(df, weight)
+    numeric = _numeric(df, weight)
+    stats = {}
+    for column in numeric.columns:
+        values = numeric[column].to_numpy(dtype=float)
+        valid = ~np.isnan(values)
+        x, wx = values[valid], w[valid]
+        n = wx.sum()
+        mean = (wx * x).sum() / n
+        stats[column] = [n, mean, np.sqrt((wx * (x - mean) ** 2).sum() / (n - 1)), x.min(),
+                         *percentile(x, [25, 50, 75], wx), x.max()]
+    return pd.DataFrame(stats, index=['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'])
+
+
+def value_counts(df, column, weight=None):
+    if weight is None:
+        return df[column].value_counts()
+    counts = df.groupby(column)[weight].sum().sort_values(ascending=False).rename('count')
+    return _as_counts(counts, counts.to_numpy())
+
+
+def crosstab(df, rows, cols, normalize=False, margins=False, weight=None):
+    # rows and cols may be a single column name or a list of names
+    rows = [rows] if isinstance(rows, str) else list(rows)
+    cols = [cols] if isinstance(cols, str) else list(cols)
+    if weight is None:
+        return pd.crosstab([df[c] for c in rows], [df[c] for c in cols],
+                           margins=margins, normalize=normalize)
+    table = pd.crosstab([df[c] for c in rows], [df[c] for c in cols], values=df[weight], aggfunc='sum',
+                        margins=margins, normalize=normalize).fillna(0)
+    return table if normalize is not False else _as_counts(table, _weights(df, weight))
+
+
+def product_revenue(df, weight=None):
+    if weight is None:
+        return df.groupby(['Product'])['Product_price'].sum().reset_index().rename(columns=
+                                                                                   {"Product_price":'Product_revenue'})
+    revenue = (df['Product_price'] * _weights(df, weight)).groupby(df['Product']).sum()
+    return _as_counts(revenue, revenue.to_numpy()).rename('Product_revenue').reset_index()
+
+
+def outliers(df, column, weight=None):
+    w = _weights(df, weight)
+    Q1, Q3 = percentile(df[column], [25, 75], w if weight is not None else None)
+    IQR = Q3 - Q1
+    UpperWhisker = Q3 + (1.5*(IQR))
+    outlier_data = df[df[column]>UpperWhisker]
+    count = w[(df[column]>UpperWhisker).to_numpy()].sum()
+    return {"Q1": Q1, "Q3": Q3, "IQR": IQR, "UpperWhisker": UpperWhisker,
+            "Outliers": int(count) if _whole(w) else count,
+            "Product": value_counts(outlier_data, "Product", weight).to_dict()}
+
+
+def correlations(df, weight=None):
+    if weight is None:
+        return df.corr(numeric_only=True)
+    w = _weights(df, weight)
+    numeric = _numeric(df, weight)
+    x = numeric.to_numpy(dtype=float)
+    centered = x - (w[:, None] * x).sum(axis=0) / w.sum()
+    cov = (w[:, None] * centered).T @ centered
+    scale = np.sqrt(np.diag(cov))
+    return pd.DataFrame(cov / np.outer(scale, scale), index=numeric.columns, columns=numeric.columns)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Duplicate detection for large sales extracts.
+#
+# Rows are hashed column-wise into 64-bit keys (pandas' vectorised
+# hash_pandas_object). For a single frame, `duplicated` gives the same answer
+# as df.duplicated(), but only rows whose key repeats are compared exactly.
+#
+# For data that does not fit in memory, `duplicate_report` streams csv files in
+# chunks and runs two passes over them:
+#
+#   1. every key goes into a Bloom filter; keys that were (probably) seen
+#      before become candidates,
+#   2. only candidate rows are kept and compared exactly, so memory is bounded
+#      by the Bloom filter plus the (usually few) duplicates and false positives.
+#
+#   duplicate_report(['sales_north.csv', 'sales_south.csv'])
+#
+# The Bloom filter is sized for `capacity` rows. When it is not given, the row
+# count is estimated from the file sizes and the bytes per line of the first
+# lines of every file, instead of reading the files a third time.
+#
+# returns one row per file (partition) with its row count and the number of
+# rows that repeat an earlier row (in the same or an earlier file).
+
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+
+CHUNK_ROWS = 1_000_000
+SAMPLE_LINES = 10_000
+
+
+def row_hashes(df):
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def duplicated(df):
+    keys = pd.Series(row_hashes(df), index=df.index)
+    candidates = keys.duplicated(keep=False)
+    result = pd.Series(False, index=df.index)
+    if candidates.any():
+        # equal keys are compared exactly, so hash collisions are never reported
+        result[candidates] = df[candidates.to_numpy()].duplicated().to_numpy()
+    return result
+
+
+class BloomFilter:
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.bits = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self._array = np.zeros((self.bits + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, keys):
+        # double hashing: position_i = h1 + i * h2 (mod bits)
+        keys = np.asarray(keys, dtype=np.uint64)
+        h1 = keys
+        h2 = ((keys >> np.uint64(33)) ^ (keys * np.uint64(0x9E3779B97F4A7C15))) | np.uint64(1)
+        i = np.arange(self.hashes, dtype=np.uint64)[:, None]
+        return (h1 + i * h2) % np.uint64(self.bits)
+
+    def add(self, keys):
+        positions = self._positions(keys).ravel()
+        np.bitwise_or.at(self._array, positions >> np.uint64(3),
+                         (1 << (positions & np.uint64(7))).astype(np.uint8))
+
+    def __contains__(self, key):
+        return bool(self.contains([key])[0])
+
+    def contains(self, keys):
+        positions = self._positions(keys)
+        bits = (self._array[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1
+        return bits.all(axis=0)
+
+
+def _chunks(path, chunksize):
+    # everything is read as text so that keys do not depend on the dtypes
+    # pandas infers for a particular chunk
+    return pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunksize)
+
+
+def estimate_rows(path, lines=SAMPLE_LINES):
+    # rows of a csv file from its size and the length of its first lines
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = len(f.readline())
+        sample = [len(line) for _, line in zip(range(lines), f)]
+    if not sample:
+        return 0
+    return math.ceil((size - header) / (sum(sample) / len(sample)))
+
+
+def duplicate_report(paths, chunksize=CHUNK_ROWS, capacity=None, error_rate=0.01):
+    paths = list(paths)
+    if capacity is None:
+        # a little headroom, as later lines may be shorter than the first ones
+        capacity = math.ceil(1.1 * sum(estimate_rows(path) for path in paths))
+    bloom = BloomFilter(max(capacity, 1), error_rate)
+
+    # pass 1: keys that may have been seen before
+    candidates = []
+    for path in paths:
+        for chunk in _chunks(path, chunksize):
+            keys = row_hashes(chunk)
+            repeated = bloom.contains(keys) | pd.Series(keys).duplicated().to_numpy()
+            candidates.append(keys[repeated])
+            bloom.add(keys)
+    candidates = np.unique(np.concatenate(candidates)) if candidates else np.empty(0, np.uint64)
+
+    # pass 2: exact comparison of the candidate rows only
+    seen = {}
+    report = []
+    for path in paths:
+        rows = duplicates = 0
+        for chunk in _chunks(path, chunksize):
+            rows += len(chunk)
+            keys = row_hashes(chunk)
+            hit = np.isin(keys, candidates)
+            for key, record in zip(keys[hit].tolist(), chunk[hit].itertuples(index=False, name=None)):
+                records = seen.setdefault(key, [])
+                if record in records:
+                    duplicates += 1
+                else:
+                    records.append(record)
+        report.append({"Partition": path, "Rows": rows, "Duplicates": duplicates})
+    return pd.DataFrame(report)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Export of every result table of a run into one SQLite database.
+#
+#   python aerofit_export.py --data Aerofit_treadmill.csv --out aerofit_results.sqlite
+#
+# The pipeline results (crosstabs, revenue, correlations, outlier checks, ...)
+# are flattened into plain tables, named after their node and key, e.g.
+# "crosstabs/Product by Gender". All tables are inserted into a new database
+# in a single transaction, written to a temporary file and moved into place at
+# the end, so readers never see a half-written run. The "_run" table holds the
+# run's metadata and the list of exported tables.
+
+import argparse
+import datetime
+import os
+import sqlite3
+
+import pandas as pd
+
+import aerofit_data
+import aerofit_pipeline
+
+
+def _flat(name):
+    return ' / '.join(str(n) for n in name if str(n)) if isinstance(name, tuple) else str(name)
+
+
+def _frame(value):
+    if isinstance(value, pd.Series):
+        value = value.to_frame('value' if value.name is None else value.name)
+    value = value.copy()
+    value.columns = [_flat(c) for c in value.columns]
+    if not isinstance(value.index, pd.RangeIndex):
+        value = value.reset_index()
+        value.columns = [_flat(c) for c in value.columns]
+    return value
+
+
+def result_tables(results, prefix=''):
+    # {name: DataFrame} for all tables in (nested) pipeline results; plain
+    # values of a dict are gathered in one row, one typed column per key (a
+    # tuple such as a shape gives one column per item), e.g. the table
+    # "miles_outliers" with the columns Q1, Q3, IQR, UpperWhisker, Outliers
+    tables = {}
+    values = {}
+    for key, value in results.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            tables[name] = _frame(value)
+        elif isinstance(value, dict):
+            tables.update(result_tables(value, f'{name}/'))
+        elif isinstance(value, tuple):
+            values.update({f'{key}[{i}]': item for i, item in enumerate(value)})
+        elif not isinstance(value, bytes):
+            values[str(key)] = value
+    if values:
+        tables[prefix.rstrip('/') or 'values'] = pd.DataFrame([values])
+    return tables
+
+
+def _sql_type(dtype):
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    return 'TEXT'
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _rows(df):
+    # python values, with NaN as NULL
+    return df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+
+def export_sqlite(tables, path, run=None):
+    run = dict(run or {})
+    run.setdefault('created', datetime.datetime.now().isoformat(timespec='seconds'))
+    run['tables'] = ', '.join(tables)
+
+    tmp = f'{path}.tmp'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    con = sqlite3.connect(tmp)
+    try:
+        with con:
+            for name, df in [('_run', pd.DataFrame({"Name": list(run), "Value": [str(v) for v in run.values()]}))] + \
+                    list(tables.items()):
+                columns = ', '.join(f'{_quote(c)} {_sql_type(t)}' for c, t in df.dtypes.items())
+                con.execute(f'CREATE TABLE {_quote(name)} ({columns})')
+                con.executemany(f'INSERT INTO {_quote(name)} VALUES ({", ".join("?" * len(df.columns))})', _rows(df))
+    finally:
+        con.close()
+    os.replace(tmp, path)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the Aerofit result tables to SQLite")
+    parser.add_argument("--data", default=aerofit_data.DATA_PATH)
+    parser.add_argument("--out", default="aerofit_results.sqlite")
+    parser.add_argument("--cache-dir", default=aerofit_pipeline.CACHE_DIR)
+    parser.add_argument("--weight", default=None, help="count column of pre-aggregated data")
+    args = parser.parse_args()
+
+    pipeline = aerofit_pipeline.aerofit_pipeline(args.cache_dir)
+    # the prepared data itself is not a result table
+    targets = [name for name in pipeline.nodes if name != 'enriched']
+    results = pipeline.run(targets, sales=aerofit_data.load_data(args.data), price=aerofit_data.product_price,
+                           weight=args.weight)
+    tables = result_tables(results)
+    export_sqlite(tables, args.out, {"data": os.path.abspath(args.data)})
+    print(f"{len(tables)} tables written to {args.out}")
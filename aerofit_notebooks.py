@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Headless batch runs of the AeroFit notebooks, one run per notebook and region.
+#
+#   python aerofit_notebooks.py --region north=data/north.csv --region south=data/south.csv --out runs
+#
+# Each run gets a parameters cell (DATA_PATH, REGION) at the top, and the
+# notebook's own read_csv of the treadmill csv is pointed at DATA_PATH. Runs
+# are spread over a process pool, each with its own kernel. Images are written
+# to disk as soon as their cell finishes, and the saved notebook only keeps a
+# reference to the file, so the executed notebooks stay small. The time taken
+# by every cell is saved next to the notebook and returned as a table.
+#
+# Needs nbformat and nbclient (pip install nbclient).
+
+import argparse
+import base64
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import aerofit_data
+
+
+NOTEBOOKS = ['AEROFIT.ipynb', 'Aerofit Case study.ipynb']
+
+_read_csv = re.compile(r"""read_csv\(\s*(['"])[^'"]*treadmill\.csv\1\s*\)""", re.IGNORECASE)
+
+_image_types = {'image/png': 'png', 'image/jpeg': 'jpg', 'image/gif': 'gif'}
+
+
+def parameterize(nb, data_path, region):
+    import nbformat
+
+    for cell in nb.cells:
+        if cell.cell_type == 'code':
+            cell.source = _read_csv.sub('read_csv(DATA_PATH)', cell.source)
+    parameters = nbformat.v4.new_code_cell(f"# Parameters\nDATA_PATH = {data_path!r}\nREGION = {region!r}\n")
+    parameters.metadata['tags'] = ['parameters']
+    nb.cells.insert(0, parameters)
+    return nb
+
+
+def save_images(cell, cell_index, image_dir):
+    # replace embedded images of one cell by files in image_dir
+    for n, output in enumerate(cell.get('outputs', [])):
+        data = output.get('data', {})
+        for mime, extension in _image_types.items():
+            if mime in data:
+                os.makedirs(image_dir, exist_ok=True)
+                path = os.path.join(image_dir, f'cell{cell_index:03d}_{n}.{extension}')
+                with open(path, 'wb') as f:
+                    f.write(base64.b64decode(data.pop(mime)))
+                data['text/plain'] = f'[{mime} saved to {path}]'
+
+
+def run_notebook(notebook, data_path, region, out_dir, timeout=600):
+    import nbformat
+    from nbclient import NotebookClient
+
+    stem = f'{os.path.splitext(os.path.basename(notebook))[0]}-{region}'
+    image_dir = os.path.join(out_dir, f'{stem}_images')
+    nb = parameterize(nbformat.read(notebook, as_version=4), os.path.abspath(data_path), region)
+
+    timings = []
+    started = {}
+
+    def on_cell_start(cell, cell_index):
+        started[cell_index] = time.perf_counter()
+
+    def on_cell_executed(cell, cell_index, execute_reply):
+        save_images(cell, cell_index, image_dir)
+        timings.append({"Notebook": notebook, "Region": region, "Cell": cell_index,
+                        "Execution_count": cell.get('execution_count'),
+                        "Status": execute_reply['content']['status'],
+                        "Seconds": time.perf_counter() - started.pop(cell_index)})
+
+    # the kernel runs in out_dir, so files written by the notebook land there
+    client = NotebookClient(nb, timeout=timeout, kernel_name='python3', allow_errors=True,
+                            resources={'metadata': {'path': out_dir}},
+                            on_cell_start=on_cell_start, on_cell_executed=on_cell_executed)
+    client.execute()
+
+    nbformat.write(nb, os.path.join(out_dir, f'{stem}.ipynb'))
+    timings = pd.DataFrame(timings)
+    timings.to_csv(os.path.join(out_dir, f'{stem}_timings.csv'), index=False)
+    return timings
+
+
+def run_batch(notebooks, regions, out_dir, workers=None, timeout=600):
+    out_dir = os.path.abspath(out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        runs = [pool.submit(run_notebook, notebook, data_path, region, out_dir, timeout)
+                for notebook in notebooks for region, data_path in regions.items()]
+        return pd.concat([run.result() for run in runs], ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Aerofit notebooks for several regions")
+    parser.add_argument("--notebook", action="append", help="notebook to run (default: both notebooks)")
+    parser.add_argument("--region", action="append", metavar="NAME=CSV",
+                        help=f"region name and its data file (default: all={aerofit_data.DATA_PATH})")
+    parser.add_argument("--out", default="notebook_runs")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--timeout", type=int, default=600, help="seconds per cell")
+    args = parser.parse_args()
+
+    regions = dict(r.split("=", 1) for r in args.region) if args.region else {"all": aerofit_data.DATA_PATH}
+    timings = run_batch(args.notebook or NOTEBOOKS, regions, args.out, args.workers, args.timeout)
+
+    print(timings.groupby(["Notebook", "Region"])["Seconds"].agg(["count", "sum", "max"]))
+    print()
+    print("Slowest cells:")
+    print(timings.sort_values("Seconds", ascending=False).head(10))
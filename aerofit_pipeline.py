@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# The case study as a dependency graph of cells, with cached results.
+#
+#   sales, price  ->  enriched  ->  crosstabs, revenue, correlations, fitness, charts
+#   sales         ->  summary, miles_outliers, income_outliers
+#
+# Every node is cached on disk under a key made from its code, the source of
+# the modules it depends on (aerofit_data for every node here) and the content
+# hashes of its inputs, so a run only recomputes the nodes whose inputs or code
+# really changed. Code a node calls outside those modules is not tracked: list
+# it in `depends` when adding the node, or clear the cache after editing it.
+#
+# Changing `product_price` recomputes `enriched` and what depends on it, but
+# not the outlier checks on the raw sales; appending sales recomputes
+# everything that reads them.
+#
+#   python aerofit_pipeline.py --data Aerofit_treadmill.csv
+#
+#   pipeline = aerofit_pipeline()
+#   results = pipeline.run(sales=df, price=product_price)
+#   pipeline.status      # {'enriched': 'cached', 'revenue': 'computed', ...}
+#
+# For pre-aggregated sales pass the name of their count column as the `weight`
+# source, e.g. pipeline.run(sales=df, price=product_price, weight='count').
+
+import argparse
+import hashlib
+import inspect
+import os
+import pickle
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+import aerofit_data
+
+
+CACHE_DIR = '.aerofit_cache'
+
+
+def content_hash(value):
+    h = hashlib.sha256()
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        labels = list(value.columns) if isinstance(value, pd.DataFrame) else value.name
+        h.update(repr((type(value).__name__, labels, [str(t) for t in np.atleast_1d(value.dtypes)])).encode())
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, dict):
+        for key in sorted(value, key=str):
+            h.update(repr(key).encode())
+            h.update(content_hash(value[key]).encode())
+    else:
+        h.update(pickle.dumps(value))
+    return h.hexdigest()
+
+
+def _code_hash(obj):
+    # hash of the source of a function or module
+    try:
+        source = inspect.getsource(obj).encode()
+    except (OSError, TypeError):
+        source = obj.__code__.co_code if hasattr(obj, '__code__') else repr(obj).encode()
+    return hashlib.sha256(source).hexdigest()
+
+
+class Pipeline:
+
+    def __init__(self, cache_dir=CACHE_DIR, defaults=None, depends=()):
+        self.cache_dir = cache_dir
+        self.defaults = dict(defaults or {})
+        self.depends = tuple(depends)
+        self.nodes = {}
+        self.status = {}
+
+    def node(self, *inputs, depends=()):
+        # depends: modules or functions the node calls, whose source is part
+        # of the cache key (on top of the pipeline-wide ones)
+        def register(func):
+            code = '/'.join(_code_hash(f) for f in (func,) + self.depends + tuple(depends))
+            self.nodes[func.__name__] = (code, func, inputs)
+            return func
+        return register
+
+    def _path(self, key, suffix):
+        return os.path.join(self.cache_dir, f'{key}.{suffix}')
+
+    def run(self, targets=None, **sources):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        sources = {**self.defaults, **sources}
+        self.status = {name: 'source' for name in sources}
+        hashes = {name: content_hash(value) for name, value in sources.items()}
+        values = dict(sources)
+        keys = {}
+
+        def resolve(name):
+            # output hash of a node; the value itself is only loaded when needed
+            if name in hashes:
+                return hashes[name]
+            if name not in self.nodes:
+                raise KeyError(f"no node or source named {name!r}")
+            code, func, inputs = self.nodes[name]
+            key = hashlib.sha256(repr((name, code, [resolve(i) for i in inputs])).encode()).hexdigest()
+            keys[name] = key
+            if os.path.exists(self._path(key, 'hash')):
+                with open(self._path(key, 'hash')) as f:
+                    hashes[name] = f.read()
+                self.status[name] = 'cached'
+            else:
+                value = func(*[load(i) for i in inputs])
+                hashes[name] = content_hash(value)
+                with open(self._path(key, 'pkl'), 'wb') as f:
+                    pickle.dump(value, f)
+                with open(self._path(key, 'hash'), 'w') as f:
+                    f.write(hashes[name])
+                values[name] = value
+                self.status[name] = 'computed'
+            return hashes[name]
+
+        def load(name):
+            resolve(name)
+            if name not in values:
+                with open(self._path(keys[name], 'pkl'), 'rb') as f:
+                    values[name] = pickle.load(f)
+            return values[name]
+
+        targets = list(self.nodes) if targets is None else targets
+        return {name: load(name) for name in targets}
+
+
+def aerofit_pipeline(cache_dir=CACHE_DIR, with_charts=False):
+    pipeline = Pipeline(cache_dir, defaults={'weight': None}, depends=[aerofit_data])
+
+    @pipeline.node('sales', 'weight')
+    def summary(sales, weight):
+        if weight is None:
+            return {"shape": sales.shape,
+                    "null_percentage": sales.isnull().sum(axis=0) / len(sales) * 100,
+                    "describe": sales.describe(),
+                    "duplicates": sales.loc[sales.duplicated()]}
+        # as for the data with every row repeated `weight` times: a customer
+        # repeats when its row has weight > 1 or the same values appear on
+        # several rows
+        w = sales[weight]
+        data = sales.drop(columns=[weight])
+        totals = w.groupby([data[c] for c in data.columns], dropna=False).sum()
+        repeats = totals[totals > 1] - 1
+        duplicates = repeats.index.repeat(repeats.astype(int)).to_frame(index=False)
+        return {"shape": (int(w.sum()) if (w % 1 == 0).all() else w.sum(), data.shape[1]),
+                "null_percentage": data.isnull().mul(w, axis=0).sum(axis=0) / w.sum() * 100,
+                "describe": aerofit_data.describe(sales, weight),
+                "duplicates": duplicates}
+
+    @pipeline.node('sales', 'price')
+    def enriched(sales, price):
+        return aerofit_data.prepare_data(sales, price)
+
+    @pipeline.node('sales', 'weight')
+    def miles_outliers(sales, weight):
+        return aerofit_data.outliers(sales, 'Miles', weight)
+
+    @pipeline.node('sales', 'weight')
+    def income_outliers(sales, weight):
+        return aerofit_data.outliers(sales, 'Income', weight)
+
+    @pipeline.node('enriched', 'weight')
+    def revenue(enriched, weight):
+        return aerofit_data.product_revenue(enriched, weight)
+
+    @pipeline.node('enriched', 'weight')
+    def crosstabs(enriched, weight):
+        ct = partial(aerofit_data.crosstab, weight=weight)
+        return {"Product by Gender": ct(enriched, 'Product', 'Gender', margins=True),
+                "Product by Gender (columns)": ct(enriched, 'Product', 'Gender', margins=True, normalize='columns'),
+                "Product by MaritalStatus": ct(enriched, 'Product', 'MaritalStatus', margins=True),
+                "Product by MaritalStatus (columns)": ct(enriched, 'Product', 'MaritalStatus', margins=True,
+                                                         normalize='columns'),
+                "Product by MaritalStatus and Gender": ct(enriched, 'Product', ['MaritalStatus', 'Gender'],
+                                                          margins=True),
+                "Education by Product": ct(enriched, 'Education', 'Product', margins=True),
+                "Usage by Product": ct(enriched, 'Usage', 'Product', margins=True),
+                "Usage by Product (columns)": ct(enriched, 'Usage', 'Product', normalize='columns'),
+                "Fitness_category by Product": ct(enriched, 'Fitness_category', 'Product', margins=True),
+                "Fitness_category by Product (columns)": ct(enriched, 'Fitness_category', 'Product',
+                                                            normalize='columns'),
+                "Product and Fitness_category by Gender": ct(enriched, ['Product', 'Fitness_category'], 'Gender'),
+                "Product and Gender by Fitness": ct(enriched, ['Product', 'Gender'], 'Fitness', margins=True)}
+
+    @pipeline.node('enriched', 'weight')
+    def fitness(enriched, weight):
+        miles = enriched['Miles per 1 use']
+        p95 = aerofit_data.percentile(miles, 95, None if weight is None else enriched[weight])
+        return {"Miles per 1 use > 40": aerofit_data.value_counts(enriched[miles>40], 'Fitness_category', weight),
+                "Miles per 1 use > 95th percentile":
+                    aerofit_data.value_counts(enriched[miles>p95], 'Fitness_category', weight)}
+
+    @pipeline.node('enriched', 'weight')
+    def correlations(enriched, weight):
+        return aerofit_data.correlations(enriched, weight)
+
+    if with_charts:
+        import aerofit_service
+
+        @pipeline.node('enriched', 'weight', depends=[aerofit_service])
+        def charts(enriched, weight):
+            chart_png = aerofit_service.chart_png
+            params = {} if weight is None else {"weight": weight}
+            return {f"{x} distribution": chart_png(enriched, {"kind": "count", "x": x, **params})[1]
+                    for x in ["Gender", "MaritalStatus", "Product"]}
+
+    return pipeline
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Aerofit case study pipeline")
+    parser.add_argument("--data", default=aerofit_data.DATA_PATH)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--charts", action="store_true")
+    parser.add_argument("--weight", default=None, help="count column of pre-aggregated data")
+    args = parser.parse_args()
+
+    pipeline = aerofit_pipeline(args.cache_dir, with_charts=args.charts)
+    results = pipeline.run(sales=aerofit_data.load_data(args.data), price=aerofit_data.product_price,
+                           weight=args.weight)
+    for name, state in pipeline.status.items():
+        print(f"{name:20} {state}")
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# What-if pricing over the revenue aggregation.
+#
+# The revenue in the notebook is the unit count of every product times its
+# price. The unit counts per customer segment and product are computed once;
+# revenue under any number of price scenarios is then one matrix product of
+# the scenario x product price matrix with the segment x product counts,
+# instead of re-merging the price table into the data per scenario:
+#
+#   simulator = PricingSimulator(aerofit_data.load_data(), segment=['Gender'])
+#   scenarios = price_grid({"KP281": [1400, 1500, 1600], "KP481": range(1600, 1901, 50),
+#                           "KP781": range(2300, 2801, 25)})
+#   simulator.revenue(scenarios).sort_values('Total', ascending=False).head()
+#
+# With a price elasticity per segment (or per segment and product) the units
+# sold in a scenario are scaled by (price / base price) ** elasticity.
+# For pre-aggregated data, `weight` names the column with the customers per row.
+
+import itertools
+
+import numpy as np
+import pandas as pd
+
+import aerofit_data
+
+
+def price_grid(prices):
+    # every combination of the candidate prices per product, one row per scenario
+    products = list(prices)
+    return pd.DataFrame(list(itertools.product(*[list(prices[p]) for p in products])), columns=products)
+
+
+class PricingSimulator:
+
+    def __init__(self, df, segment=('Gender', 'MaritalStatus'), price=aerofit_data.product_price, weight=None):
+        segment = [segment] if isinstance(segment, str) else list(segment)
+        grouped = df.groupby(segment + ['Product'])
+        units = grouped.size() if weight is None else grouped[weight].sum()
+        self.units = units.unstack('Product', fill_value=0)
+        base = price.set_index('Product')['Product_price']
+        self.products = list(self.units.columns)
+        self.base_price = base.reindex(self.products).to_numpy(dtype=float)
+
+    def _prices(self, scenarios):
+        if isinstance(scenarios, pd.DataFrame):
+            return scenarios.reindex(columns=self.products).to_numpy(dtype=float), scenarios.index
+        prices = np.atleast_2d(np.asarray(scenarios, dtype=float))
+        return prices, pd.RangeIndex(len(prices), name='Scenario')
+
+    def _elasticity(self, elasticity):
+        # array of shape (segments, products)
+        if isinstance(elasticity, pd.DataFrame):
+            return elasticity.reindex(index=self.units.index, columns=self.products).to_numpy(dtype=float)
+        if isinstance(elasticity, pd.Series):
+            elasticity = elasticity.reindex(self.units.index).to_numpy(dtype=float)
+        elasticity = np.asarray(elasticity, dtype=float)
+        if elasticity.ndim < 2:
+            elasticity = np.broadcast_to(elasticity.reshape(-1, 1), (len(self.units), len(self.products)))
+        return elasticity
+
+    def revenue(self, scenarios, elasticity=None):
+        # revenue per scenario (rows) and segment (columns), plus the total
+        prices, index = self._prices(scenarios)
+        units = self.units.to_numpy(dtype=float)
+        if elasticity is None:
+            revenue = prices @ units.T
+        else:
+            scale = (prices[:, None, :] / self.base_price[None, None, :]) ** self._elasticity(elasticity)[None, :, :]
+            revenue = np.einsum('sp,gp,sgp->sg', prices, units, scale)
+        columns = [' / '.join(map(str, s)) if isinstance(s, tuple) else str(s) for s in self.units.index]
+        result = pd.DataFrame(revenue, index=index, columns=columns)
+        result['Total'] = revenue.sum(axis=1)
+        if isinstance(scenarios, pd.DataFrame):
+            result = pd.concat([scenarios[self.products], result], axis=1)
+        return result
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Customer segments found from the data instead of from the charts.
+#
+# Customers are clustered on standardised Age, Education, Usage, Fitness,
+# Income and Miles with mini-batch k-means written in NumPy. The data is read
+# in chunks (one pass for the means and standard deviations, a few passes to
+# fit, one to assign and profile), so memory use depends on the chunk size and
+# not on the number of customers:
+#
+#   result = segment(csv_chunks('Aerofit_treadmill.csv'), k=3)
+#   result.clusters            # size, feature means and shares per cluster
+#   result.products            # the same per product, with its main cluster
+#   print('\n'.join(result.describe()))
+
+import math
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+import aerofit_data
+
+
+FEATURES = ['Age', 'Education', 'Usage', 'Fitness', 'Income', 'Miles']
+CHUNK_ROWS = 100_000
+
+
+def csv_chunks(path=aerofit_data.DATA_PATH, chunksize=CHUNK_ROWS):
+    # a fresh iterator over the file for every pass
+    return lambda: pd.read_csv(path, chunksize=chunksize)
+
+
+def _passes(data):
+    if isinstance(data, pd.DataFrame):
+        return lambda: [data]
+    return data
+
+
+class MiniBatchKMeans:
+
+    def __init__(self, k=3, batch_size=1024, seed=None):
+        self.k = k
+        self.batch_size = batch_size
+        self.centers = None
+        self.counts = np.zeros(k)
+        self._rng = np.random.default_rng(seed)
+
+    def _init_centers(self, X):
+        # k-means++ seeding on the first batch
+        centers = [X[self._rng.integers(len(X))]]
+        for _ in range(1, self.k):
+            d = np.min(((X[:, None, :] - np.array(centers)[None, :, :]) ** 2).sum(axis=2), axis=1)
+            p = d / d.sum() if d.sum() > 0 else None
+            centers.append(X[self._rng.choice(len(X), p=p)])
+        self.centers = np.array(centers, dtype=float)
+
+    def predict(self, X):
+        # squared distances as |x|^2 - 2 x.c + |c|^2, without an n*k*d array
+        d = (X ** 2).sum(axis=1)[:, None] - 2 * X @ self.centers.T + (self.centers ** 2).sum(axis=1)[None, :]
+        return d.argmin(axis=1)
+
+    def partial_fit(self, X):
+        if self.centers is None:
+            self._init_centers(X)
+        order = self._rng.permutation(len(X))
+        for start in range(0, len(X), self.batch_size):
+            batch = X[order[start:start + self.batch_size]]
+            labels = self.predict(batch)
+            m = np.bincount(labels, minlength=self.k)
+            sums = np.zeros_like(self.centers)
+            np.add.at(sums, labels, batch)
+            # every center moves towards the mean of its points with a
+            # per-center learning rate of (points this batch) / (points so far)
+            self.counts += m
+            seen = m > 0
+            self.centers[seen] += (sums[seen] - m[seen, None] * self.centers[seen]) / self.counts[seen, None]
+        return self
+
+
+def _standardize(df, mean, std):
+    return (df[FEATURES].to_numpy(dtype=float) - mean) / std
+
+
+def segment(data, k=3, epochs=3, batch_size=1024, seed=0):
+    passes = _passes(data)
+
+    # pass 1: means and standard deviations
+    n, total, squares = 0, np.zeros(len(FEATURES)), np.zeros(len(FEATURES))
+    for chunk in passes():
+        values = chunk[FEATURES].to_numpy(dtype=float)
+        n += len(values)
+        total += values.sum(axis=0)
+        squares += (values ** 2).sum(axis=0)
+    mean = total / n
+    std = np.sqrt(np.maximum(squares / n - mean ** 2, 0))
+    std[std == 0] = 1
+
+    # fit
+    model = MiniBatchKMeans(k, batch_size, seed)
+    for _ in range(epochs):
+        for chunk in passes():
+            model.partial_fit(_standardize(chunk, mean, std))
+
+    # last pass: assign and accumulate the profiles
+    clusters, products = [], []
+    for chunk in passes():
+        chunk = chunk.assign(Cluster=model.predict(_standardize(chunk, mean, std)))
+        for by, parts in ((['Cluster'], clusters), (['Product'], products)):
+            grouped = chunk.groupby(by)
+            parts.append(pd.concat([grouped.size().rename('Customers'),
+                                    grouped[FEATURES].sum()], axis=1))
+            for column in ('Product', 'Gender', 'MaritalStatus', 'Cluster'):
+                if column not in by:
+                    parts.append(chunk.groupby(by + [column]).size().unstack(column))
+    cluster_table = _profile(clusters, 'Cluster', n)
+    product_table = _profile(products, 'Product', n)
+    product_table['Main cluster'] = product_table.filter(like='Cluster ').idxmax(axis=1)
+
+    centers = pd.DataFrame(model.centers * std + mean, columns=FEATURES)
+    centers.index.name = 'Cluster'
+    return Segmentation(centers, cluster_table, product_table, pd.Series(mean, FEATURES), pd.Series(std, FEATURES))
+
+
+def _profile(parts, name, n):
+    # sum the per-chunk counts and sums, then turn them into means and shares
+    table = pd.concat(parts).groupby(level=0).sum(min_count=1).fillna(0)
+    table.index.name = name
+    customers = table['Customers']
+    profile = pd.DataFrame({'Customers': customers.astype(int), 'Share': customers / n})
+    for column in FEATURES:
+        profile[column] = table[column] / customers
+    for column in table.columns.difference(['Customers'] + FEATURES, sort=False):
+        label = f'Cluster {column}' if name != 'Cluster' and isinstance(column, (int, np.integer)) else column
+        profile[label] = table[column] / customers
+    return profile
+
+
+def _level(z):
+    if z > 1:
+        return 'well above average'
+    if z > 0.5:
+        return 'above average'
+    if z < -1:
+        return 'well below average'
+    if z < -0.5:
+        return 'below average'
+    return 'average'
+
+
+def _describe_row(title, row, result, groups):
+    lines = [f"{title} : {int(row['Customers'])} customers ({row['Share']:.1%})"]
+    for name, group in groups.items():
+        share = row[group].astype(float)
+        if len(share) and not math.isnan(share.max()):
+            lines.append(f"* {name}: mostly {share.idxmax()} ({share.max():.0%})")
+    for column in FEATURES:
+        z = (row[column] - result.mean[column]) / result.std[column]
+        lines.append(f"* {column}: {row[column]:,.1f} ({_level(z)})")
+    return lines
+
+
+class Segmentation(namedtuple('Segmentation', ['centers', 'clusters', 'products', 'mean', 'std'])):
+
+    def describe(self):
+        # customer profiles in the style of the notebook's closing notes
+        clusters, products = self.clusters, self.products
+        values = {'Product': set(products.index), 'Gender': {'Male', 'Female'},
+                  'MaritalStatus': {'Single', 'Partnered'}}
+        lines = []
+        for cluster, row in clusters.iterrows():
+            groups = {name: [c for c in clusters.columns if c in v] for name, v in values.items()}
+            lines += _describe_row(f"Cluster {cluster}", row, self, groups) + [""]
+        for product, row in products.iterrows():
+            groups = {name: [c for c in products.columns if c in v] for name, v in values.items()
+                      if name != 'Product'}
+            lines += _describe_row(product, row, self, groups)
+            lines.append(f"* main cluster: {row['Main cluster']}")
+            lines.append("")
+        return lines
+
+
+if __name__ == "__main__":
+    print('\n'.join(segment(csv_chunks()).describe()))
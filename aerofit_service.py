@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Local HTTP service for the AeroFit case study tables and charts.
+#
+#   python aerofit_service.py --data Aerofit_treadmill.csv --port 8050
+#
+#   GET /crosstab?rows=Product&cols=Gender&normalize=columns&margins=true
+#   GET /describe
+#   GET /revenue
+#   GET /outliers?column=Miles
+#   GET /corr
+#   GET /chart?kind=count&x=Gender
+#   GET /chart?kind=box&x=Gender&y=Income
+#   GET /chart?kind=bar&rows=Product&cols=MaritalStatus
+#
+# The table endpoints and the count and bar charts take an optional `weight`
+# parameter naming a count column, for pre-aggregated data (e.g.
+# /crosstab?rows=Product&cols=Gender&weight=count); a weighted box chart is a
+# bad request.
+#
+# Tables are returned as JSON (pandas "split" orientation), charts as PNG.
+# Results are kept in an LRU cache keyed by the data version (size and
+# modification time of the csv) and the query parameters, and every
+# computation runs in a process pool so that one slow request does not block
+# the event loop for the other dashboard users.
+
+import argparse
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlsplit
+
+import aerofit_data
+
+
+class LRUCache:
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+
+    def get(self, key):
+        if key not in self._items:
+            return None
+        self._items.move_to_end(key)
+        return self._items[key]
+
+    def put(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+def data_version(path):
+    st = os.stat(path)
+    return (st.st_size, st.st_mtime_ns)
+
+
+# ### Worker side (runs inside the process pool)
+
+_frames = {}
+
+
+def _get_frame(path, version):
+    # each worker process keeps the prepared data of the latest version only
+    key = (path, version)
+    if key not in _frames:
+        _frames.clear()
+        _frames[key] = aerofit_data.prepare_data(aerofit_data.load_data(path))
+    return _frames[key]
+
+
+def _as_bool(value):
+    return str(value).lower() in ("1", "true", "yes")
+
+
+def _columns(value):
+    return value.split(",")
+
+
+def _table_json(table):
+    return "application/json", table.to_json(orient="split").encode()
+
+
+def chart_png(df, params):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    kind = params.get("kind", "count")
+    weight = params.get("weight")
+    if kind not in ("count", "box", "bar"):
+        raise ValueError(f"unknown chart kind {kind!r}")
+    if kind == "box" and weight is not None:
+        raise ValueError("box charts cannot be weighted")
+    sns.set(font_scale = 1.1)
+    fig = plt.figure(figsize=(10,5))
+    try:
+        if kind == "count" and weight is None:
+            sns.countplot(data = df , x = params["x"])
+        elif kind == "count":
+            counts = aerofit_data.value_counts(df, params["x"], weight)
+            sns.barplot(x=counts.index.astype(str), y=counts.to_numpy(), ax=fig.gca())
+            plt.xlabel(params["x"])
+        elif kind == "box":
+            sns.boxplot(x= params["x"], y=params["y"], data=df)
+        else:
+            aerofit_data.crosstab(df, _columns(params["rows"]), _columns(params["cols"]), weight=weight).plot(
+                kind="bar", stacked=False, rot=0, ax=fig.gca())
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png", bbox_inches="tight")
+    finally:
+        plt.close(fig)
+    return "image/png", buf.getvalue()
+
+
+def compute(path, version, endpoint, params):
+    df = _get_frame(path, version)
+    weight = params.get("weight")
+    if endpoint == "/crosstab":
+        normalize = params.get("normalize", False)
+        if normalize in ("true", "false"):
+            normalize = _as_bool(normalize)
+        return _table_json(aerofit_data.crosstab(df, _columns(params["rows"]), _columns(params["cols"]),
+                                                 normalize=normalize,
+                                                 margins=_as_bool(params.get("margins", False)),
+                                                 weight=weight))
+    if endpoint == "/describe":
+        return _table_json(aerofit_data.describe(df, weight))
+    if endpoint == "/revenue":
+        return _table_json(aerofit_data.product_revenue(df, weight))
+    if endpoint == "/outliers":
+        result = aerofit_data.outliers(df, params.get("column", "Miles"), weight)
+        return "application/json", json.dumps(result, default=float).encode()
+    if endpoint == "/corr":
+        return _table_json(aerofit_data.correlations(df, weight))
+    if endpoint == "/chart":
+        return chart_png(df, params)
+    raise LookupError(endpoint)
+
+
+# ### Server side
+
+class ReportService:
+
+    def __init__(self, path, workers=None, cache_size=256):
+        self.path = path
+        self.cache = LRUCache(cache_size)
+        # workers are spawned rather than forked: a forked worker would inherit
+        # the open client socket of the first request, and that client would
+        # never see the connection close
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        self._pending = {}
+
+    async def result(self, endpoint, params):
+        version = data_version(self.path)
+        key = (version, endpoint, tuple(sorted(params.items())))
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        # identical requests arriving together share one computation
+        if key not in self._pending:
+            loop = asyncio.get_running_loop()
+            self._pending[key] = loop.run_in_executor(self.pool, compute, self.path, version, endpoint, params)
+        future = self._pending[key]
+        try:
+            value = await asyncio.shield(future)
+        finally:
+            if future.done():
+                self._pending.pop(key, None)
+        self.cache.put(key, value)
+        return value
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+            url = urlsplit(target)
+            if method != "GET":
+                status, content_type, body = 405, "text/plain", b"method not allowed"
+            else:
+                try:
+                    content_type, body = await self.result(url.path, dict(parse_qsl(url.query)))
+                    status = 200
+                except (KeyError, ValueError, TypeError) as e:
+                    status, content_type, body = 400, "text/plain", f"bad request: {e}".encode()
+                except LookupError as e:
+                    status, content_type, body = 404, "text/plain", f"not found: {e}".encode()
+        except ValueError:
+            status, content_type, body = 400, "text/plain", b"bad request"
+        writer.write(f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+        writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8050):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Aerofit report service on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.pool.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aerofit report service")
+    parser.add_argument("--data", default=aerofit_data.DATA_PATH)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8050)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cache-size", type=int, default=256)
+    args = parser.parse_args()
+
+    service = ReportService(args.data, workers=args.workers, cache_size=args.cache_size)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Memory-mapped, column-sorted store for the prepared AeroFit data.
+#
+# Every column is written as its own .npy file (text columns as integer codes),
+# and every numeric column also gets a sorted copy plus the row ids in that
+# order. Range filters such as
+#
+#   df[df['Miles per 1 use']>40]['Fitness_category'].value_counts()
+#
+# then become a binary search over the sorted copy, returning a slice of row
+# ids, and the value counts are taken on the codes of those rows without
+# building a sub-frame:
+#
+#   store = build_store(aerofit_data.prepare_data(aerofit_data.load_data()), 'aerofit_store')
+#   store.value_counts('Fitness_category', store.select('Miles per 1 use', '>', 40))
+#
+# Numeric columns also get a zone map: the min and max of every block of
+# `block_rows` rows in storage order. `scan` uses it to skip blocks that
+# cannot match a predicate (and to take blocks that match entirely without
+# reading them), and reports how many blocks were scanned and skipped:
+#
+#   rows, stats = store.scan('Income', '>', UpperWhisker)
+
+import json
+import operator
+import os
+
+import numpy as np
+import pandas as pd
+
+
+META_FILE = 'meta.json'
+BLOCK_ROWS = 65536
+
+_operators = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le, '==': operator.eq}
+
+
+def _file(path, kind, i):
+    return os.path.join(path, f'{kind}_{i}.npy')
+
+
+def _zone_map(values, block_rows):
+    starts = np.arange(0, len(values), block_rows)
+    with np.errstate(invalid='ignore'):
+        # all-NaN blocks get NaN bounds, which never satisfy a predicate
+        zmin = np.fmin.reduceat(values.astype(float), starts) if len(values) else np.empty(0)
+        zmax = np.fmax.reduceat(values.astype(float), starts) if len(values) else np.empty(0)
+    has_nan = np.logical_or.reduceat(pd.isna(values), starts) if len(values) else np.empty(0, bool)
+    return zmin, zmax, has_nan
+
+
+def build_store(df, path, block_rows=BLOCK_ROWS):
+    os.makedirs(path, exist_ok=True)
+    meta = {"rows": len(df), "block_rows": block_rows, "columns": []}
+    for i, name in enumerate(df.columns):
+        column = df[name]
+        if pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column):
+            values = column.to_numpy()
+            order = np.argsort(values, kind='stable')
+            np.save(_file(path, 'col', i), values)
+            np.save(_file(path, 'sorted', i), values[order])
+            np.save(_file(path, 'idx', i), order)
+            zmin, zmax, has_nan = _zone_map(values, block_rows)
+            np.save(_file(path, 'zmin', i), zmin)
+            np.save(_file(path, 'zmax', i), zmax)
+            np.save(_file(path, 'znan', i), has_nan)
+            # NaNs sort to the end and are never part of a range
+            valid = int(np.count_nonzero(~pd.isna(values)))
+            meta["columns"].append({"name": name, "kind": "numeric", "valid": valid})
+        else:
+            codes, categories = pd.factorize(column, sort=True)
+            np.save(_file(path, 'col', i), codes.astype(np.int32))
+            meta["columns"].append({"name": name, "kind": "category",
+                                    "categories": [str(c) for c in categories]})
+    with open(os.path.join(path, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=1)
+    return RecordStore(path)
+
+
+class RecordStore:
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.rows = self.meta["rows"]
+        self._position = {c["name"]: i for i, c in enumerate(self.meta["columns"])}
+        self._arrays = {}
+
+    @property
+    def columns(self):
+        return list(self._position)
+
+    def _info(self, column):
+        return self.meta["columns"][self._position[column]]
+
+    def _load(self, kind, column):
+        key = (kind, column)
+        if key not in self._arrays:
+            self._arrays[key] = np.load(_file(self.path, kind, self._position[column]), mmap_mode='r')
+        return self._arrays[key]
+
+    def values(self, column):
+        return self._load('col', column)
+
+    def sorted_values(self, column):
+        info = self._info(column)
+        if info["kind"] != "numeric":
+            raise TypeError(f"{column!r} is not a numeric column")
+        return self._load('sorted', column)[:info["valid"]]
+
+    def select(self, column, op, value):
+        # row ids (a read-only slice of the sort index) where `column op value`
+        values = self.sorted_values(column)
+        if op == '>':
+            start, stop = np.searchsorted(values, value, side='right'), len(values)
+        elif op == '>=':
+            start, stop = np.searchsorted(values, value, side='left'), len(values)
+        elif op == '<':
+            start, stop = 0, np.searchsorted(values, value, side='left')
+        elif op == '<=':
+            start, stop = 0, np.searchsorted(values, value, side='right')
+        elif op == '==':
+            start = np.searchsorted(values, value, side='left')
+            stop = np.searchsorted(values, value, side='right')
+        else:
+            raise ValueError(f"unknown operator {op!r}")
+        return self._load('idx', column)[start:stop]
+
+    def between(self, column, low, high):
+        # low <= column <= high
+        values = self.sorted_values(column)
+        start = np.searchsorted(values, low, side='left')
+        stop = np.searchsorted(values, high, side='right')
+        return self._load('idx', column)[start:stop]
+
+    def scan(self, column, op, value):
+        # row ids (in storage order) where `column op value`, found by a block
+        # scan that uses the zone map to skip or take whole blocks
+        if self._info(column)["kind"] != "numeric":
+            raise TypeError(f"{column!r} is not a numeric column")
+        if op not in _operators:
+            raise ValueError(f"unknown operator {op!r}")
+        test = _operators[op]
+        zmin, zmax = self._load('zmin', column), self._load('zmax', column)
+        has_nan = self._load('znan', column)
+        with np.errstate(invalid='ignore'):
+            if op == '==':
+                full = (zmin == value) & (zmax == value)
+                skip = ~((zmin <= value) & (value <= zmax))
+            else:
+                low, high = test(zmin, value), test(zmax, value)
+                full = low & high
+                skip = ~(low | high)
+        full &= ~has_nan
+
+        block_rows = self.meta["block_rows"]
+        values = self.values(column)
+        parts = []
+        for block in np.flatnonzero(~skip):
+            start = block * block_rows
+            stop = min(start + block_rows, self.rows)
+            if full[block]:
+                parts.append(np.arange(start, stop))
+            else:
+                with np.errstate(invalid='ignore'):
+                    parts.append(start + np.flatnonzero(test(values[start:stop], value)))
+        rows = np.concatenate(parts) if parts else np.empty(0, dtype=np.intp)
+        stats = {"blocks": len(zmin),
+                 "skipped": int(skip.sum()),
+                 "matched": int((full & ~skip).sum()),
+                 "scanned": int((~skip & ~full).sum())}
+        return rows, stats
+
+    def percentile(self, column, q):
+        # same as np.percentile(df[column], q) (linear interpolation), read
+        # straight from the sorted copy
+        values = self.sorted_values(column)
+        position = (len(values) - 1) * np.asarray(q, dtype=float) / 100
+        lower = np.floor(position).astype(int)
+        upper = np.minimum(lower + 1, len(values) - 1)
+        fraction = position - lower
+        return values[lower] + (values[upper] - values[lower]) * fraction
+
+    def value_counts(self, column, rows=None):
+        info = self._info(column)
+        values = self.values(column)
+        if rows is not None:
+            values = values[np.asarray(rows)]
+        if info["kind"] == "category":
+            values = values[values >= 0]
+            counts = pd.Series(np.bincount(values, minlength=len(info["categories"])),
+                               index=pd.Index(info["categories"], name=column), name='count')
+            counts = counts[counts > 0]
+        else:
+            labels, counts = np.unique(values, return_counts=True)
+            counts = pd.Series(counts, index=pd.Index(labels, name=column), name='count')
+        return counts.sort_values(ascending=False, kind='stable')
+
+    def frame(self, rows=None, columns=None):
+        columns = self.columns if columns is None else columns
+        rows = slice(None) if rows is None else np.sort(np.asarray(rows))
+        data = {}
+        for name in columns:
+            info = self._info(name)
+            values = np.asarray(self.values(name)[rows])
+            if info["kind"] == "category":
+                values = pd.Categorical.from_codes(values, info["categories"])
+            data[name] = values
+        return pd.DataFrame(data)
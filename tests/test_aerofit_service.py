@@ -0,0 +1,41 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_first_request_gets_a_response():
+    port = _free_port()
+    server = subprocess.Popen([sys.executable, "aerofit_service.py", "--port", str(port), "--workers", "1"],
+                              cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                assert time.time() < deadline, "service did not start"
+                time.sleep(0.2)
+        # read until the server closes the connection, as a client without
+        # Content-Length support would
+        with socket.create_connection(("127.0.0.1", port), timeout=10) as client:
+            client.sendall(b"GET /crosstab?rows=Product&cols=Gender&normalize=columns HTTP/1.1\r\n"
+                           b"Host: localhost\r\n\r\n")
+            response = b""
+            while chunk := client.recv(65536):
+                response += chunk
+        assert response.startswith(b"HTTP/1.1 200")
+        assert b'"KP281"' in response
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
@@ -0,0 +1,69 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import aerofit_data  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def data():
+    # customers aggregated without Age and Income, so that rows repeat, and the
+    # same customers expanded again to one row each
+    sales = aerofit_data.load_data(os.path.join(ROOT, aerofit_data.DATA_PATH)).drop(columns=['Age', 'Income'])
+    aggregated = aerofit_data.prepare_data(sales.groupby(list(sales.columns)).size().rename('count').reset_index())
+    expanded = aggregated.loc[aggregated.index.repeat(aggregated['count'])].drop(columns=['count'])
+    assert len(aggregated) < len(expanded) == len(sales)
+    return aggregated, expanded.reset_index(drop=True)
+
+
+def test_describe(data):
+    aggregated, expanded = data
+    pd.testing.assert_frame_equal(aerofit_data.describe(aggregated, 'count'), aerofit_data.describe(expanded))
+
+
+def test_value_counts(data):
+    aggregated, expanded = data
+    for column in ['Product', 'Gender', 'Fitness_category']:
+        pd.testing.assert_series_equal(aerofit_data.value_counts(aggregated, column, 'count'),
+                                       aerofit_data.value_counts(expanded, column), check_index_type=False)
+
+
+@pytest.mark.parametrize("normalize", [False, True, 'all', 'index', 'columns'])
+@pytest.mark.parametrize("margins", [False, True])
+def test_crosstab(data, normalize, margins):
+    aggregated, expanded = data
+    for rows, cols in [('Product', 'Gender'), ('Product', ['MaritalStatus', 'Gender']), ('Usage', 'Product')]:
+        pd.testing.assert_frame_equal(
+            aerofit_data.crosstab(aggregated, rows, cols, normalize=normalize, margins=margins, weight='count'),
+            aerofit_data.crosstab(expanded, rows, cols, normalize=normalize, margins=margins))
+
+
+def test_product_revenue(data):
+    aggregated, expanded = data
+    pd.testing.assert_frame_equal(aerofit_data.product_revenue(aggregated, 'count'),
+                                  aerofit_data.product_revenue(expanded))
+
+
+def test_outliers(data):
+    aggregated, expanded = data
+    for column in ['Miles', 'Miles per 1 use']:
+        assert aerofit_data.outliers(aggregated, column, 'count') == aerofit_data.outliers(expanded, column)
+
+
+def test_correlations(data):
+    aggregated, expanded = data
+    pd.testing.assert_frame_equal(aerofit_data.correlations(aggregated, 'count'),
+                                  aerofit_data.correlations(expanded))
+
+
+def test_percentile(data):
+    aggregated, expanded = data
+    q = [0, 5, 25, 50, 75, 95, 100]
+    np.testing.assert_allclose(aerofit_data.percentile(aggregated['Miles'], q, aggregated['count']),
+                               aerofit_data.percentile(expanded['Miles'], q))